@@ -1,14 +1,26 @@
 import os
 import sqlite3
-from datetime import datetime, timedelta
-from typing import List, Dict
+from itertools import islice
+from typing import Iterable, Iterator, Sequence, Tuple
 from pathlib import Path
 
+import numpy as np
+
 class ChromeHistoryExtractor:
     """Extracts and stores Chrome browsing history."""
     
-    CHROME_EPOCH = datetime(1601, 1, 1)
+    CHROME_EPOCH = np.datetime64('1601-01-01', 'us')
+    # Rows converted per vectorized timestamp pass while streaming
+    CHUNK_SIZE = 10_000
     DEFAULT_CHROME_PATH = "~/.config/google-chrome/Default/History"
+    SQLITE_PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA cache_size=-65536",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA mmap_size=268435456",
+        "PRAGMA journal_size_limit=67108864",
+    )
     
     def __init__(self, output_db: str = 'local_browsing_history.db'):
         """
@@ -38,52 +50,70 @@ class ChromeHistoryExtractor:
         return history_path
 
     @staticmethod
-    def _convert_chrome_time(chrome_timestamp: int) -> datetime:
+    def _convert_chrome_times(chrome_timestamps: Sequence[int]) -> np.ndarray:
+        """
+        Convert Chrome timestamps to formatted datetime strings in one pass.
+        
+        Args:
+            chrome_timestamps (Sequence[int]): Chrome's microsecond timestamps
+            
+        Returns:
+            np.ndarray: "YYYY-MM-DD HH:MM:SS" strings
+        """
+        times = (np.asarray(chrome_timestamps, dtype='i8').astype('timedelta64[us]')
+                 + ChromeHistoryExtractor.CHROME_EPOCH)
+        return np.char.replace(np.datetime_as_string(times, unit='s'), 'T', ' ')
+
+    def _format_history(self, history_data: Iterable[Tuple[str, str, int]]
+                        ) -> Iterator[Tuple[str, str, str]]:
         """
-        Convert Chrome's timestamp to datetime.
+        Convert timestamps chunk by chunk while keeping the input streamed.
         
         Args:
-            chrome_timestamp (int): Chrome's microsecond timestamp
+            history_data (Iterable[Tuple[str, str, int]]): (url, title,
+                chrome_timestamp) rows
             
         Returns:
-            datetime: Converted datetime object
+            Iterator[Tuple[str, str, str]]: (url, title, visit_time) rows
         """
-        return ChromeHistoryExtractor.CHROME_EPOCH + timedelta(microseconds=chrome_timestamp)
+        rows = iter(history_data)
+        while True:
+            chunk = list(islice(rows, self.CHUNK_SIZE))
+            if not chunk:
+                return
+            urls, titles, visit_times = zip(*chunk)
+            yield from zip(urls, titles, self._convert_chrome_times(visit_times).tolist())
 
-    def extract_history(self) -> List[Dict]:
+    def extract_history(self) -> Iterator[Tuple[str, str, int]]:
         """
-        Extract browsing history from Chrome's database.
+        Stream browsing history from Chrome's database.
+        
+        Rows are yielded straight from the cursor, so the source connection
+        stays open until the iterator is exhausted.
         
         Returns:
-            List[Dict]: List of browsing history entries
+            Iterator[Tuple[str, str, int]]: (url, title, chrome_timestamp) rows
         """
         query = """
-            SELECT urls.url, urls.title, visits.visit_time
-            FROM urls, visits
-            WHERE urls.id = visits.url
-            ORDER BY visits.visit_time DESC
+            SELECT u.url, u.title, v.visit_time
+            FROM visits v
+            JOIN urls u ON u.id = v.url
+            ORDER BY v.visit_time DESC
         """
         
-        with sqlite3.connect(self.chrome_history_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute(query)
-            results = cursor.fetchall()
-
-        return [
-            {
-                'url': url,
-                'title': title,
-                'visit_time': self._convert_chrome_time(visit_time)
-            }
-            for url, title, visit_time in results
-        ]
+        conn = sqlite3.connect(self.chrome_history_path)
+        try:
+            yield from conn.execute(query)
+        finally:
+            conn.close()
 
-    def store_history(self, history_data: List[Dict]) -> None:
+    def store_history(self, history_data: Iterable[Tuple[str, str, int]]) -> None:
         """
         Store browsing history in a local SQLite database.
         
         Args:
-            history_data (List[Dict]): List of history entries to store
+            history_data (Iterable[Tuple[str, str, int]]): (url, title,
+                chrome_timestamp) rows to store, consumed lazily
         """
         create_table_query = """
             CREATE TABLE IF NOT EXISTS browsing_history (
@@ -100,22 +130,21 @@ class ChromeHistoryExtractor:
         """
         
         with sqlite3.connect(self.output_db) as conn:
+            for pragma in self.SQLITE_PRAGMAS:
+                conn.execute(pragma)
             cursor = conn.cursor()
             cursor.execute(create_table_query)
             
-            history_entries = [
-                (
-                    entry['url'],
-                    entry['title'],
-                    entry['visit_time'].strftime("%Y-%m-%d %H:%M:%S")
-                )
-                for entry in history_data
-            ]
-            
-            cursor.executemany(insert_query, history_entries)
+            # Run the whole insert as one transaction
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.executemany(insert_query, self._format_history(history_data))
+            stored = cursor.rowcount
             conn.commit()
             
-        print(f"Stored {len(history_data)} entries in {self.output_db}")
+            # Refresh planner statistics after the bulk load
+            cursor.execute("ANALYZE")
+            
+        print(f"Stored {stored} entries in {self.output_db}")
 
     def process(self) -> None:
         """Extract and store Chrome history in one operation."""
@@ -1,73 +1,319 @@
+import asyncio
+import math
+import random
 import sqlite3
+from contextlib import closing
 import numpy as np
 import faiss
+import httpx
 import openai
-from typing import List, Tuple
+import tiktoken
+from typing import Iterable, Iterator, List, Optional, Tuple
 
 class EmbeddingProcessor:
-    def __init__(self, db_name: str = 'local_browsing_history.db'):
+    # Per-request limits for the embeddings endpoint: ada-002 accepts up to
+    # 2048 inputs per call, the token cap keeps us well below the TPM quota.
+    MAX_BATCH_SIZE = 1024
+    MAX_BATCH_TOKENS = 200_000
+    # Number of embedding requests kept in flight at once
+    MAX_CONCURRENCY = 16
+    MAX_RETRIES = 6
+    # IVF-PQ settings; smaller collections stay on an exact flat index since
+    # there is too little data to train the coarse quantizer and codebooks
+    MIN_IVF_VECTORS = 10_000
+    MAX_IVF_LISTS = 4096
+    PQ_SUBQUANTIZERS = 96
+    PQ_BITS = 8
+    MAX_TRAIN_VECTORS = 100_000
+    # FAISS wants at least this many training points per k-means centroid
+    MIN_POINTS_PER_CENTROID = 39
+    # Text embedded for each row; the filter checks the same expression so
+    # rows that would embed as an empty string are skipped
+    TEXT_EXPR = "TRIM(COALESCE(title, '') || ' ' || COALESCE(description, ''))"
+    HAS_TEXT_FILTER = f"{TEXT_EXPR} != ''"
+
+    def __init__(self, db_name: str = 'local_browsing_history.db',
+                 client: Optional[openai.AsyncOpenAI] = None):
         """
         Initialize the EmbeddingProcessor with database configuration.
         
         Args:
             db_name (str): Name of the SQLite database file
+            client (Optional[openai.AsyncOpenAI]): Client to reuse for
+                embedding requests; a pooled HTTP/2 client is created per
+                run when omitted
         """
         self.db_name = db_name
         self.model_name = "text-embedding-ada-002"
+        self.client = client
+
+    def count_metadata_rows(self, conn: sqlite3.Connection) -> int:
+        """
+        Count the rows that read_metadata_from_db will return.
+        
+        Args:
+            conn (sqlite3.Connection): Connection to read from
+            
+        Returns:
+            int: Number of rows with non-empty text
+        """
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT COUNT(*) FROM browsing_history WHERE {self.HAS_TEXT_FILTER}"
+        )
+        return cursor.fetchone()[0]
 
-    def read_metadata_from_db(self) -> List[Tuple]:
+    def read_metadata_from_db(self, conn: sqlite3.Connection
+                              ) -> Iterator[Tuple[int, str]]:
         """
-        Read metadata from SQLite database.
+        Stream the text to embed for each row from the SQLite database.
         
+        Title and description are joined in SQL and rows without text are
+        skipped.
+        
+        Args:
+            conn (sqlite3.Connection): Connection to read from
+            
         Returns:
-            List[Tuple]: List of (id, title, description) tuples
+            Iterator[Tuple[int, str]]: (id, text) rows
         """
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, title, description FROM browsing_history")
-            return cursor.fetchall()
+        return conn.execute(
+            f"SELECT id, {self.TEXT_EXPR} "
+            f"FROM browsing_history WHERE {self.HAS_TEXT_FILTER}"
+        )
 
-    def encode_texts(self, texts: List[str]) -> List[List[float]]:
+    async def encode_texts(self, client: openai.AsyncOpenAI,
+                           texts: List[str]) -> List[List[float]]:
         """
         Generate embeddings for given texts using OpenAI's API.
         
         Args:
+            client (openai.AsyncOpenAI): Client used for the request
             texts (List[str]): List of texts to encode
             
         Returns:
             List[List[float]]: List of embeddings
         """
-        response = openai.embeddings.create(
+        response = await client.embeddings.create(
             input=texts,
             model=self.model_name
         )
         return [item.embedding for item in response.data]
 
-    def process_and_store_embeddings(self, batch_size: int = 10) -> None:
+    async def _encode_batch_async(self, client: openai.AsyncOpenAI,
+                                  sem: asyncio.Semaphore,
+                                  batch: List[str]) -> np.ndarray:
         """
-        Process texts and store their embeddings in a FAISS index.
+        Encode one batch, retrying with exponential backoff when rate limited.
         
         Args:
-            batch_size (int): Number of texts to process in each batch
+            client (openai.AsyncOpenAI): Client used for the request
+            sem (asyncio.Semaphore): Semaphore bounding in-flight requests
+            batch (List[str]): Texts to encode
+            
+        Returns:
+            np.ndarray: L2-normalized embeddings of the batch as float32
         """
-        # Read metadata and prepare texts
-        metadata = self.read_metadata_from_db()
-        texts = [f"{title} {description}" for _, title, description in metadata]
+        async with sem:
+            for attempt in range(self.MAX_RETRIES):
+                try:
+                    embeddings = np.asarray(await self.encode_texts(client, batch),
+                                            dtype=np.float32)
+                    # Normalize once here so the index can compare by inner product
+                    faiss.normalize_L2(embeddings)
+                    return embeddings
+                except openai.RateLimitError:
+                    if attempt == self.MAX_RETRIES - 1:
+                        raise
+                    await asyncio.sleep(min(2 ** attempt, 60) + random.random())
 
-        # Initialize FAISS index with first batch
-        first_batch_embedding = np.array(self.encode_texts(texts[:1]))
-        embedding_dim = first_batch_embedding.shape[1]
-        index = faiss.IndexFlatL2(embedding_dim)
+    async def _encode_all_async(self, batches: List[List[str]], n_texts: int,
+                                concurrency: int) -> np.ndarray:
+        """
+        Encode all batches concurrently into a single preallocated buffer.
+        
+        Args:
+            batches (List[List[str]]): Batches of texts, in input order
+            n_texts (int): Total number of texts across all batches
+            concurrency (int): Maximum number of requests in flight
+            
+        Returns:
+            np.ndarray: Array of shape (n_texts, embedding_dim)
+        """
+        if self.client is not None:
+            return await self._encode_with_client(self.client, batches,
+                                                  n_texts, concurrency)
+            
+        limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(http2=True, limits=limits) as http_client:
+            client = openai.AsyncOpenAI(api_key=openai.api_key,
+                                        http_client=http_client)
+            return await self._encode_with_client(client, batches,
+                                                  n_texts, concurrency)
 
-        # Process remaining texts in batches
-        total_batches = (len(texts) + batch_size - 1) // batch_size
+    async def _encode_with_client(self, client: openai.AsyncOpenAI,
+                                  batches: List[List[str]], n_texts: int,
+                                  concurrency: int) -> np.ndarray:
+        """
+        Encode all batches concurrently using the given client.
         
-        for i in range(0, len(texts), batch_size):
-            batch_texts = texts[i:i + batch_size]
-            embeddings = self.encode_texts(batch_texts)
-            index.add(np.array(embeddings).astype(np.float32))
+        Args:
+            client (openai.AsyncOpenAI): Client used for the requests
+            batches (List[List[str]]): Batches of texts, in input order
+            n_texts (int): Total number of texts across all batches
+            concurrency (int): Maximum number of requests in flight
             
-            print(f"Processed batch {i // batch_size + 1} of {total_batches}")
+        Returns:
+            np.ndarray: Array of shape (n_texts, embedding_dim)
+        """
+        all_embeddings = None
+        completed = 0
+        sem = asyncio.Semaphore(concurrency)
+
+        async def encode_into(offset: int, batch: List[str]) -> None:
+            nonlocal all_embeddings, completed
+            embeddings = await self._encode_batch_async(client, sem, batch)
+            
+            # Size the buffer from the first response that comes back
+            if all_embeddings is None:
+                all_embeddings = np.empty((n_texts, embeddings.shape[1]),
+                                          dtype=np.float32)
+                
+            all_embeddings[offset:offset + len(embeddings)] = embeddings
+            completed += 1
+            print(f"Processed batch {completed} of {len(batches)}")
+
+        tasks, offset = [], 0
+        for batch in batches:
+            tasks.append(encode_into(offset, batch))
+            offset += len(batch)
+        await asyncio.gather(*tasks)
+
+        return all_embeddings
+
+    @staticmethod
+    def _iter_texts(metadata: Iterable[Tuple[int, str]],
+                    ids: np.ndarray) -> Iterator[str]:
+        """
+        Yield the text to embed for each row, recording its id in order.
+        
+        Args:
+            metadata (Iterable[Tuple[int, str]]): (id, text) rows
+            ids (np.ndarray): Buffer filled with row ids as texts are yielded
+            
+        Returns:
+            Iterator[str]: Texts to embed
+        """
+        for i, (row_id, text) in enumerate(metadata):
+            ids[i] = row_id
+            yield text
+
+    def batch_texts(self, texts: Iterable[str], batch_size: int,
+                    max_tokens: int) -> List[List[str]]:
+        """
+        Pack texts into batches bounded by both input count and token count.
+        
+        Args:
+            texts (Iterable[str]): Texts to pack
+            batch_size (int): Maximum number of texts per batch
+            max_tokens (int): Maximum number of tokens per batch
+            
+        Returns:
+            List[List[str]]: Batches of texts, in input order
+        """
+        encoding = tiktoken.encoding_for_model(self.model_name)
+        batches, batch, batch_tokens = [], [], 0
+        
+        for text in texts:
+            n_tokens = len(encoding.encode(text, disallowed_special=()))
+            if batch and (len(batch) >= batch_size
+                          or batch_tokens + n_tokens > max_tokens):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += n_tokens
+            
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def build_index(self, embeddings: np.ndarray, ids: np.ndarray) -> faiss.Index:
+        """
+        Build a FAISS index sized to the number of embeddings.
+        
+        Both index types compare by inner product, which equals cosine
+        similarity on the normalized vectors. Vectors are stored under their
+        database ids so search results can be looked up directly.
+        
+        Args:
+            embeddings (np.ndarray): L2-normalized array of shape (n, embedding_dim)
+            ids (np.ndarray): int64 database id of each embedding row
+            
+        Returns:
+            faiss.Index: Populated index
+        """
+        n_vectors, embedding_dim = embeddings.shape
+        
+        if n_vectors < self.MIN_IVF_VECTORS:
+            # 8-bit codes take a quarter of the memory of fp32
+            index = faiss.IndexScalarQuantizer(embedding_dim,
+                                               faiss.ScalarQuantizer.QT_8bit,
+                                               faiss.METRIC_INNER_PRODUCT)
+            # Below MIN_IVF_VECTORS training on everything is cheap
+            index.train(embeddings)
+            index = faiss.IndexIDMap2(index)
+        else:
+            # Cap the list count so the coarse quantizer is fully trained
+            n_train = min(n_vectors, self.MAX_TRAIN_VECTORS)
+            n_lists = min(self.MAX_IVF_LISTS, 4 * int(math.sqrt(n_vectors)),
+                          n_train // self.MIN_POINTS_PER_CENTROID)
+            quantizer = faiss.IndexFlatIP(embedding_dim)
+            index = faiss.IndexIVFPQ(quantizer, embedding_dim, n_lists,
+                                     self.PQ_SUBQUANTIZERS, self.PQ_BITS,
+                                     faiss.METRIC_INNER_PRODUCT)
+            
+            # Train on a random sample rather than the whole collection
+            sample = np.random.default_rng().choice(n_vectors, n_train, replace=False)
+            index.train(embeddings[np.sort(sample)])
+            
+        # IVF indexes keep ids in their inverted lists, others go through IDMap2
+        index.add_with_ids(embeddings, ids)
+        return index
+
+    def process_and_store_embeddings(self, batch_size: int = MAX_BATCH_SIZE,
+                                     max_tokens: int = MAX_BATCH_TOKENS,
+                                     concurrency: int = MAX_CONCURRENCY) -> None:
+        """
+        Process texts and store their embeddings in a FAISS index.
+        
+        Args:
+            batch_size (int): Maximum number of texts sent per API request
+            max_tokens (int): Maximum number of tokens sent per API request
+            concurrency (int): Maximum number of API requests in flight
+        """
+        # Count and read inside one read transaction so both see the same rows
+        with closing(sqlite3.connect(self.db_name)) as conn:
+            conn.execute("BEGIN")
+            
+            # Size the embedding buffer up front from the row count
+            n_rows = self.count_metadata_rows(conn)
+            if not n_rows:
+                print("No texts to embed.")
+                return
+
+            # Read metadata and prepare texts, keeping each row's id
+            metadata = self.read_metadata_from_db(conn)
+            ids = np.empty(n_rows, dtype=np.int64)
+            texts = self._iter_texts(metadata, ids)
+            batches = self.batch_texts(texts, batch_size, max_tokens)
+            conn.rollback()
+
+        all_embeddings = asyncio.run(
+            self._encode_all_async(batches, n_rows, concurrency)
+        )
+
+        # Add all vectors in one call to avoid repeated index growth
+        index = self.build_index(all_embeddings, ids)
 
         # Save index to disk
         faiss.write_index(index, 'faiss_index.bin')
@@ -1,11 +1,22 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Union
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+from typing import Iterator, Optional, List, Dict, Union
 from rag_system import RAGSystem
+from query_batcher import QueryBatcher
+import json
 import uvicorn
 
-app = FastAPI(title="RAG System API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    query_batcher.start()
+    yield
+    await query_batcher.stop()
+
+app = FastAPI(title="RAG System API", lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -17,21 +28,37 @@ app.add_middleware(
 )
 # Initialize RAG system
 rag_system = RAGSystem()
+query_batcher = QueryBatcher(rag_system)
 
 class QueryRequest(BaseModel):
     query: str
     mode: str
-    k: int = 3
+    k: int = Field(3, ge=1, le=100)
+
+def sse_events(tokens: Iterator[str]) -> Iterator[str]:
+    """Wrap text chunks as server-sent events, JSON-encoded to keep newlines."""
+    for token in tokens:
+        yield f"data: {json.dumps(token)}\n\n"
 
 @app.post("/api/query")
 async def query(request: QueryRequest):
     try:
-        response = rag_system.query(
-            user_query=request.query,
-            mode=request.mode,
-            k=request.k
-        )
-        return response
+        mode = request.mode.lower()
+        # Search and retrieval finish before streaming starts, so their errors
+        # still surface as a 500; concurrent RAG searches are batched
+        if mode == "rag":
+            _, indices = await query_batcher.search(request.query, request.k)
+            tokens = await run_in_threadpool(
+                rag_system.stream_from_indices, request.query, indices
+            )
+        elif mode == "generate":
+            tokens = await run_in_threadpool(
+                rag_system.stream_openai_response, request.query
+            )
+        else:
+            raise ValueError("Mode must be either 'rag' or 'generate'")
+            
+        return StreamingResponse(sse_events(tokens), media_type="text/event-stream")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,144 @@
+import asyncio
+import numpy as np
+import openai
+from typing import List, Optional, Set, Tuple
+
+from rag_system import RAGSystem
+
+class QueryBatcher:
+    """Groups concurrent index searches into one embedding request and search."""
+    
+    MAX_BATCH = 32
+    MAX_DELAY = 0.02
+    
+    def __init__(self, rag_system: RAGSystem,
+                 max_batch: int = MAX_BATCH,
+                 max_delay: float = MAX_DELAY):
+        """
+        Initialize the QueryBatcher.
+        
+        Args:
+            rag_system: RAG system used to run the batched searches
+            max_batch: Maximum number of queries per batch
+            max_delay: Maximum time in seconds to wait for a batch to fill
+        """
+        self.rag_system = rag_system
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Fallback searches run beside the loop; keep references until done
+        self._fallback_tasks: Set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        """Start the batching loop on the running event loop."""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._batch_loop())
+
+    async def stop(self) -> None:
+        """Stop the batching loop."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._fallback_tasks):
+            task.cancel()
+
+    async def search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Queue a query and wait for its search results.
+        
+        Args:
+            query: Search query
+            k: Number of results to return
+            
+        Returns:
+            Tuple of (distances, indices) with a single row
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, k, future))
+        return await future
+
+    async def _collect_batch(self) -> List[Tuple[str, int, asyncio.Future]]:
+        """Wait for one queued query, then gather more until full or timed out."""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_delay
+        
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _search_one(self, query: str, k: int, future: asyncio.Future) -> None:
+        """Search a single query and resolve its future with the outcome."""
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(
+                None, self.rag_system.search_batch, [query], k
+            )
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
+
+    async def _search_individually(self, batch: List[Tuple[str, int, asyncio.Future]]
+                                   ) -> None:
+        """Run each query on its own so a bad one only fails its own caller."""
+        await asyncio.gather(*[
+            self._search_one(query, k, future)
+            for query, k, future in batch
+            if not future.done()
+        ])
+
+    @staticmethod
+    def _fail_batch(batch: List[Tuple[str, int, asyncio.Future]],
+                    error: Exception) -> None:
+        """Fail every pending caller in the batch with the same error."""
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _batch_loop(self) -> None:
+        """Run batched searches and hand each caller its own result row."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            queries = [query for query, _, _ in batch]
+            max_k = max(k for _, k, _ in batch)
+            
+            # The embedding request and search block, so keep them off the loop
+            try:
+                distances, indices = await loop.run_in_executor(
+                    None, self.rag_system.search_batch, queries, max_k
+                )
+            except openai.BadRequestError as e:
+                # A rejected input fails the whole request; isolate it without
+                # holding up the next batch
+                if len(batch) == 1:
+                    self._fail_batch(batch, e)
+                    continue
+                task = loop.create_task(self._search_individually(batch))
+                self._fallback_tasks.add(task)
+                task.add_done_callback(self._fallback_tasks.discard)
+                continue
+            except Exception as e:
+                # Timeouts, rate limits and outages affect every query alike
+                self._fail_batch(batch, e)
+                continue
+                
+            for row, (_, k, future) in enumerate(batch):
+                if not future.done():
+                    future.set_result(
+                        (distances[row:row + 1, :k], indices[row:row + 1, :k])
+                    )
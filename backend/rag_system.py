@@ -1,8 +1,11 @@
 import faiss
+import httpx
 import openai
+import platform
 import sqlite3
+import threading
 import numpy as np
-from typing import List, Tuple, Optional, Union
+from typing import Iterator, List, Tuple, Optional, Union
 
 import os
 import json
@@ -63,26 +66,104 @@ def initialize_openai():
 
 
 class RAGSystem:
+    SQLITE_PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA cache_size=-65536",
+        "PRAGMA mmap_size=268435456",
+        "PRAGMA temp_store=MEMORY",
+    )
+    # Inverted lists visited per query when the index is IVF-based
+    NPROBE = 16
+    CHAT_MODEL = "gpt-4o-mini"
+    MAX_RESPONSE_TOKENS = 150
+
     def __init__(self, db_path: str = 'local_browsing_history.db', 
-                 index_path: str = 'faiss_index.bin'):
+                 index_path: str = 'faiss_index.bin',
+                 client: Optional[openai.OpenAI] = None):
         """
         Initialize the RAG system with database and index paths.
         
         Args:
             db_path: Path to SQLite database containing Chrome history
             index_path: Path to FAISS index file
+            client: OpenAI client to reuse; a keepalive HTTP/2 client is
+                created when omitted
         """
         self.db_path = db_path
         self.index_path = index_path
         self.index = None
         self.load_faiss_index()
+        self.client = client or self._create_openai_client()
+        
+        # FastAPI runs sync handlers on a threadpool, so the shared
+        # connection is guarded by a lock
+        self._conn = self._connect_db()
+        self._conn_lock = threading.Lock()
+
+    @staticmethod
+    def _create_openai_client() -> openai.OpenAI:
+        """Create an OpenAI client that keeps HTTP/2 connections alive."""
+        http_client = httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+            timeout=30
+        )
+        return openai.OpenAI(api_key=openai.api_key, http_client=http_client)
+
+    def _connect_db(self) -> sqlite3.Connection:
+        """Open the SQLite connection reused across queries."""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               isolation_level=None)
+        for pragma in self.SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        return conn
 
     def load_faiss_index(self) -> None:
-        """Load the FAISS index from disk."""
+        """Load the FAISS index from disk, memory-mapping inverted lists."""
         try:
-            self.index = faiss.read_index(self.index_path)
+            self.index = faiss.read_index(
+                self.index_path,
+                faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+            )
         except Exception as e:
             raise Exception(f"Failed to load FAISS index: {str(e)}")
+            
+        ivf_index = faiss.try_extract_index_ivf(self.index)
+        if ivf_index is not None:
+            ivf_index.nprobe = self.NPROBE
+        self._check_simd_support()
+
+    @staticmethod
+    def _check_simd_support() -> None:
+        """Warn when FAISS on x86 was loaded without its AVX2 kernels."""
+        if platform.machine().lower() not in ("x86_64", "amd64"):
+            return
+        compile_options = faiss.get_compile_options()
+        if "AVX2" not in compile_options and "AVX512" not in compile_options:
+            print("Warning: FAISS is running without AVX2 support; "
+                  "searches will use the generic distance kernels.")
+
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Encode several query texts with a single embedding request.
+        
+        Args:
+            queries: Input texts to encode
+            
+        Returns:
+            Numpy array of L2-normalized query embeddings, one row per query
+        """
+        response = self.client.embeddings.create(
+            input=queries,
+            model="text-embedding-ada-002"
+        )
+        query_embeddings = np.array(
+            [item.embedding for item in response.data], dtype=np.float32
+        )
+        # The index stores normalized vectors compared by inner product
+        faiss.normalize_L2(query_embeddings)
+        return query_embeddings
 
     def encode_query(self, query: str) -> np.ndarray:
         """
@@ -92,14 +173,9 @@ class RAGSystem:
             query: Input text to encode
             
         Returns:
-            Numpy array containing the query embedding
+            Numpy array containing the L2-normalized query embedding
         """
-        response = openai.embeddings.create(
-            input=query,
-            model="text-embedding-ada-002"
-        )
-        embedding = response.data[0].embedding
-        return np.array(embedding).reshape((1, -1))
+        return self.encode_queries([query])
 
     def search_index(self, query: str, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
         """
@@ -112,39 +188,87 @@ class RAGSystem:
         Returns:
             Tuple of (distances, indices)
         """
-        query_embedding = self.encode_query(query)
-        return self.index.search(
-            query_embedding.astype(np.float32),
-            k
-        )
+        return self.search_batch([query], k)
+
+    def search_batch(self, queries: List[str], k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search the FAISS index for several queries at once.
+        
+        Args:
+            queries: Search queries
+            k: Number of results to return per query
+            
+        Returns:
+            Tuple of (distances, indices), one row per query
+        """
+        query_embeddings = self.encode_queries(queries)
+        return self.index.search(query_embeddings, k)
 
     def retrieve_content_from_db(self, indices: List[int]) -> List[Tuple[str, str]]:
         """
         Retrieve content from SQLite database based on indices.
         
         Args:
-            indices: List of database indices to retrieve
+            indices: Search results; the index stores vectors under their
+                browsing_history ids, so these are database ids
             
         Returns:
             List of (title, description) tuples
         """
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            content = []
-            print("passed index")
-            print(indices[0])
-            
-            for idx in indices[0]:  # indices is a nested array
-                print("SELECT title, description FROM browsing_history WHERE id = "+ str(idx))
-                cursor.execute(
-                    "SELECT title, description FROM browsing_history WHERE id = "+ str(idx)
-                )
-                result = cursor.fetchone()
-                print(result)
-                if result:
-                    content.append(result)
-                    
-        return content
+        # indices is a nested array; FAISS pads missing hits with -1
+        ids = [int(idx) for idx in indices[0] if idx >= 0]
+        if not ids:
+            return []
+            
+        placeholders = ",".join("?" * len(ids))
+        with self._conn_lock:
+            cursor = self._conn.cursor()
+            cursor.execute(
+                f"SELECT id, title, description FROM browsing_history "
+                f"WHERE id IN ({placeholders})",
+                ids
+            )
+            rows = {row_id: (title, desc) for row_id, title, desc in cursor.fetchall()}
+            
+        # Preserve the ranking returned by FAISS
+        return [rows[idx] for idx in ids if idx in rows]
+
+    def _stream_chat(self, prompt: str) -> Iterator[str]:
+        """
+        Send a chat completion request and stream back its tokens.
+        
+        The request is sent before returning, so API errors are raised here
+        rather than while the tokens are being consumed.
+        
+        Args:
+            prompt: Prompt sent as the user message
+            
+        Returns:
+            Iterator over the generated text chunks
+        """
+        stream = self.client.chat.completions.create(
+            model=self.CHAT_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=self.MAX_RESPONSE_TOKENS,
+            stream=True
+        )
+        return (
+            chunk.choices[0].delta.content
+            for chunk in stream
+            if chunk.choices and chunk.choices[0].delta.content
+        )
+
+    def stream_openai_response(self, query: str) -> Iterator[str]:
+        """
+        Stream a direct response using OpenAI's API.
+        
+        Args:
+            query: User query
+            
+        Returns:
+            Iterator over the generated text chunks
+        """
+        return self._stream_chat(query)
 
     def generate_openai_response(self, query: str) -> str:
         """
@@ -156,25 +280,20 @@ class RAGSystem:
         Returns:
             Generated response
         """
-        response = openai.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": query}],
-            max_tokens=150
-        )
-        return response.choices[0].message.content
+        return "".join(self.stream_openai_response(query))
 
-    def generate_response_from_content(self, 
-                                    retrieved_content: List[Tuple[str, str]], 
-                                    query: str) -> str:
+    def stream_response_from_content(self, 
+                                     retrieved_content: List[Tuple[str, str]], 
+                                     query: str) -> Iterator[str]:
         """
-        Generate a response based on retrieved content.
+        Stream a response based on retrieved content.
         
         Args:
             retrieved_content: List of (title, description) tuples
             query: Original user query
             
         Returns:
-            Generated response
+            Iterator over the generated text chunks
         """
         context = "\n".join([
             f"Title: {title}\nDescription: {desc}" 
@@ -184,14 +303,56 @@ class RAGSystem:
         prompt = (f"Based on the following information and the user's query: "
                  f"'{query}', the retrieved response is \n\n{context} . Please strcuture the answer")
         
-        print()
+        return self._stream_chat(prompt)
 
-        response = openai.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=150
-        )
-        return response.choices[0].message.content
+    def generate_response_from_content(self, 
+                                    retrieved_content: List[Tuple[str, str]], 
+                                    query: str) -> str:
+        """
+        Generate a response based on retrieved content.
+        
+        Args:
+            retrieved_content: List of (title, description) tuples
+            query: Original user query
+            
+        Returns:
+            Generated response
+        """
+        return "".join(self.stream_response_from_content(retrieved_content, query))
+
+    def stream_from_indices(self, user_query: str, indices: np.ndarray) -> Iterator[str]:
+        """
+        Stream a RAG response from FAISS search results.
+        
+        Retrieval runs before the chat request is made, so only generation
+        overlaps with sending the response.
+        
+        Args:
+            user_query: User's question
+            indices: Indices returned by the index search for this query
+            
+        Returns:
+            Iterator over the generated text chunks
+        """
+        relevant_content = self.retrieve_content_from_db(indices)
+        
+        if not relevant_content:
+            return iter(["No relevant content found in Chrome history."])
+            
+        return self.stream_response_from_content(relevant_content, user_query)
+
+    def respond_from_indices(self, user_query: str, indices: np.ndarray) -> str:
+        """
+        Generate a RAG response from FAISS search results.
+        
+        Args:
+            user_query: User's question
+            indices: Indices returned by the index search for this query
+            
+        Returns:
+            Generated response
+        """
+        return "".join(self.stream_from_indices(user_query, indices))
 
     def query(self, 
              user_query: str, 
@@ -210,15 +371,7 @@ class RAGSystem:
         """
         if mode.lower() == "rag":
             distances, indices = self.search_index(user_query, k)
-            relevant_content = self.retrieve_content_from_db(indices)
-            
-            if not relevant_content:
-                return "No relevant content found in Chrome history."
-                
-
-            temp_answer  =self.generate_response_from_content(relevant_content, user_query)
-
-            return temp_answer
+            return self.respond_from_indices(user_query, indices)
             
         elif mode.lower() == "generate":
             return self.generate_openai_response(user_query)
@@ -1,11 +1,24 @@
+import asyncio
+import html
+import re
 import sqlite3
-import requests
-from bs4 import BeautifulSoup
-import time
-from typing import List, Tuple, Optional
+import aiohttp
+from selectolax.parser import HTMLParser
+from typing import Dict, List, Tuple, Optional
+from urllib.parse import urlparse
 from dataclasses import dataclass
 from contextlib import contextmanager
 
+# Fast paths for the two fields we need; selectolax handles pages they miss
+TITLE_RE = re.compile(rb'<title[^>]*>(.*?)</title>', re.I | re.S)
+DESC_RE = re.compile(
+    rb'<meta(?=[^>]*\bname\s*=\s*["\']description["\'])'
+    rb'[^>]*\bcontent\s*=\s*(["\'])(.*?)\1',
+    re.I | re.S
+)
+# Covers both <meta charset=...> and http-equiv Content-Type declarations
+CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?([\w-]+)', re.I)
+
 @dataclass
 class URLMetadata:
     """Data class to store URL metadata."""
@@ -16,28 +29,50 @@ class URLMetadata:
 class MetadataScraper:
     """Scrapes and stores metadata from URLs in browsing history."""
     
+    SQLITE_PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA cache_size=-65536",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA mmap_size=268435456",
+        "PRAGMA journal_size_limit=67108864",
+    )
+    # Scraped rows are flushed to the database every WRITE_BATCH_SIZE results
+    WRITE_BATCH_SIZE = 100
+    # Only <head> is needed, so bodies are read in chunks and cut off early
+    HEAD_READ_CHUNK = 8192
+    MAX_HEAD_BYTES = 65536
+    HEAD_END = b'</head>'
+
     def __init__(self, db_name: str = 'local_browsing_history.db', 
                  request_delay: int = 2, 
                  timeout: int = 5,
-                 max_urls: Optional[int] = None):
+                 max_urls: Optional[int] = None,
+                 max_concurrency: int = 50):
         """
         Initialize the MetadataScraper.
         
         Args:
             db_name (str): SQLite database filename
-            request_delay (int): Delay between requests in seconds
+            request_delay (int): Delay between requests to the same host in seconds
             timeout (int): Request timeout in seconds
             max_urls (Optional[int]): Maximum number of URLs to process
+            max_concurrency (int): Maximum number of requests in flight
         """
         self.db_name = db_name
         self.request_delay = request_delay
         self.timeout = timeout
         self.max_urls = max_urls
+        self.max_concurrency = max_concurrency
+        self._host_locks: Dict[str, asyncio.Lock] = {}
+        self._last_fetch: Dict[str, float] = {}
         
     @contextmanager
     def _db_connection(self):
         """Context manager for database connections."""
         conn = sqlite3.connect(self.db_name)
+        for pragma in self.SQLITE_PRAGMAS:
+            conn.execute(pragma)
         try:
             yield conn
         finally:
@@ -55,29 +90,103 @@ class MetadataScraper:
             cursor.execute("SELECT id, url FROM browsing_history")
             return cursor.fetchall()
 
-    def _extract_metadata(self, url: str) -> Tuple[Optional[str], Optional[str]]:
+    async def _read_head(self, response: aiohttp.ClientResponse) -> bytes:
         """
-        Extract metadata from a URL.
+        Read a response until the end of its <head> or MAX_HEAD_BYTES.
         
         Args:
-            url (str): URL to scrape
+            response (aiohttp.ClientResponse): Response to read from
             
         Returns:
-            Tuple[Optional[str], Optional[str]]: Title and description
+            bytes: HTML up to and including </head>, or the first bytes read
+        """
+        buffer = bytearray()
+        async for chunk in response.content.iter_chunked(self.HEAD_READ_CHUNK):
+            # Re-scan the tail of the previous chunk in case the tag is split
+            search_from = max(0, len(buffer) - len(self.HEAD_END) + 1)
+            buffer += chunk
+            
+            end = buffer[search_from:].lower().find(self.HEAD_END)
+            if end != -1:
+                return bytes(buffer[:search_from + end]) + b'</head></html>'
+            if len(buffer) >= self.MAX_HEAD_BYTES:
+                break
+        return bytes(buffer)
+
+    @staticmethod
+    def _decode(raw: bytes, encoding: Optional[str]) -> str:
+        """
+        Decode a matched byte string and unescape HTML entities.
+        
+        Args:
+            raw (bytes): Matched bytes
+            encoding (Optional[str]): Charset declared by the response
+            
+        Returns:
+            str: Decoded text
         """
         try:
-            response = requests.get(url, timeout=self.timeout)
-            response.raise_for_status()
+            text = raw.decode(encoding or 'utf-8', errors='replace')
+        except LookupError:
+            text = raw.decode('utf-8', errors='replace')
+        return html.unescape(text)
+
+    def _parse_metadata(self, body: bytes, encoding: Optional[str]
+                        ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Extract title and description from the start of an HTML document.
+        
+        Args:
+            body (bytes): HTML bytes, usually cut off after </head>
+            encoding (Optional[str]): Charset declared by the response header
+            
+        Returns:
+            Tuple[Optional[str], Optional[str]]: Title and description
+        """
+        # Without a header charset, honour the one declared in the markup
+        if not encoding:
+            charset_match = CHARSET_RE.search(body)
+            if charset_match:
+                encoding = charset_match.group(1).decode('ascii')
             
-            soup = BeautifulSoup(response.text, 'html.parser')
+        title_match = TITLE_RE.search(body)
+        desc_match = DESC_RE.search(body)
+        title = self._decode(title_match.group(1), encoding) if title_match else None
+        description = self._decode(desc_match.group(2), encoding) if desc_match else None
+        
+        if title_match and desc_match:
+            return title, description
             
-            # Extract title
-            title = soup.title.string if soup.title else None
+        # Fall back to a real parser for malformed or unusual markup
+        tree = HTMLParser(body, detect_encoding=True)
+        if not title_match:
+            title_node = tree.css_first('title')
+            title = title_node.text() if title_node else None
+        if not desc_match:
+            desc_node = tree.css_first('meta[name="description"]')
+            description = desc_node.attributes.get('content') if desc_node else None
             
-            # Extract description
-            meta = soup.find("meta", attrs={"name": "description"})
-            description = meta.get("content") if meta else None
+        return title, description
+
+    async def _extract_metadata(self, session: aiohttp.ClientSession,
+                                url: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Extract metadata from a URL.
+        
+        Args:
+            session (aiohttp.ClientSession): Session used for the request
+            url (str): URL to scrape
             
+        Returns:
+            Tuple[Optional[str], Optional[str]]: Title and description
+        """
+        try:
+            async with session.get(url) as response:
+                response.raise_for_status()
+                body = await self._read_head(response)
+                encoding = response.charset
+            
+            title, description = self._parse_metadata(body, encoding)
             return title or "No title found", description or "No description found"
             
         except Exception as e:
@@ -96,13 +205,36 @@ class MetadataScraper:
             
         with self._db_connection() as conn:
             cursor = conn.cursor()
+            # Stage rows in a temp table, then apply them with one UPDATE
+            cursor.execute(
+                """
+                CREATE TEMP TABLE metadata_updates (
+                    id INTEGER PRIMARY KEY,
+                    title TEXT,
+                    description TEXT
+                )
+                """
+            )
+            
+            # Run all updates as one transaction
+            cursor.execute("BEGIN IMMEDIATE")
             cursor.executemany(
+                "INSERT OR REPLACE INTO metadata_updates VALUES (?, ?, ?)",
+                [(m.url_id, m.title, m.description) for m in metadata]
+            )
+            cursor.execute(
                 """
                 UPDATE browsing_history
-                SET title = ?, description = ?
-                WHERE id = ?
-                """,
-                [(m.title, m.description, m.url_id) for m in metadata]
+                SET title = (
+                        SELECT u.title FROM metadata_updates u
+                        WHERE u.id = browsing_history.id
+                    ),
+                    description = (
+                        SELECT u.description FROM metadata_updates u
+                        WHERE u.id = browsing_history.id
+                    )
+                WHERE id IN (SELECT id FROM metadata_updates)
+                """
             )
             conn.commit()
 
@@ -125,6 +257,90 @@ class MetadataScraper:
         except sqlite3.OperationalError as e:
             print(f"Error ensuring description column: {e}")
 
+    async def _wait_for_host(self, host: str) -> None:
+        """
+        Space out requests to the same host by at least request_delay.
+        
+        Args:
+            host (str): Host about to be fetched
+        """
+        lock = self._host_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            loop = asyncio.get_running_loop()
+            last_fetch = self._last_fetch.get(host)
+            if last_fetch is not None:
+                wait = last_fetch + self.request_delay - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            self._last_fetch[host] = loop.time()
+
+    async def _bounded_fetch(self, session: aiohttp.ClientSession,
+                             sem: asyncio.Semaphore, url_id: int,
+                             url: str) -> Optional[URLMetadata]:
+        """
+        Fetch one URL under the per-host delay and global concurrency limit.
+        
+        Args:
+            session (aiohttp.ClientSession): Session used for the request
+            sem (asyncio.Semaphore): Semaphore bounding in-flight requests
+            url_id (int): Database id of the URL
+            url (str): URL to scrape
+            
+        Returns:
+            Optional[URLMetadata]: Scraped metadata, or None on failure
+        """
+        # Wait for the host while holding a slot, so the delay is measured
+        # between requests that actually start rather than queued ones
+        async with sem:
+            await self._wait_for_host(urlparse(url).netloc)
+            print(f"Processing URL: {url}")
+            title, description = await self._extract_metadata(session, url)
+            
+        if title and description:
+            print(f"Extracted - Title: {title[:50]}...")
+            return URLMetadata(url_id, title, description)
+        return None
+
+    async def _process_urls_async(self, urls: List[Tuple[int, str]]) -> int:
+        """
+        Scrape URLs concurrently, writing results to the database in batches.
+        
+        Args:
+            urls (List[Tuple[int, str]]): List of (id, url) tuples
+            
+        Returns:
+            int: Number of URLs whose metadata was stored
+        """
+        sem = asyncio.Semaphore(self.max_concurrency)
+        # Host locks and loop.time() stamps belong to this run's event loop
+        self._host_locks = {}
+        self._last_fetch = {}
+        connector = aiohttp.TCPConnector(limit=100, limit_per_host=2,
+                                         ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        
+        stored = 0
+        pending: List[URLMetadata] = []
+        headers = {'Accept-Encoding': 'gzip, deflate'}
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers=headers) as session:
+            tasks = [
+                self._bounded_fetch(session, sem, url_id, url)
+                for url_id, url in urls
+            ]
+            for task in asyncio.as_completed(tasks):
+                result = await task
+                if result:
+                    pending.append(result)
+                    
+                if len(pending) >= self.WRITE_BATCH_SIZE:
+                    self._update_metadata(pending)
+                    stored += len(pending)
+                    pending = []
+                    
+        self._update_metadata(pending)
+        return stored + len(pending)
+
     def process_urls(self) -> None:
         """Main method to process URLs and extract metadata."""
         try:
@@ -134,19 +350,8 @@ class MetadataScraper:
             if self.max_urls:
                 urls = urls[:self.max_urls]
             
-            metadata = []
-            for url_id, url in urls:
-                print(f"Processing URL: {url}")
-                title, description = self._extract_metadata(url)
-                
-                if title and description:
-                    metadata.append(URLMetadata(url_id, title, description))
-                    print(f"Extracted - Title: {title[:50]}...")
-                
-                time.sleep(self.request_delay)
-            
-            self._update_metadata(metadata)
-            print(f"Successfully processed {len(metadata)} URLs")
+            stored = asyncio.run(self._process_urls_async(urls))
+            print(f"Successfully processed {stored} URLs")
             
         except Exception as e:
             print(f"Error during processing: {e}")
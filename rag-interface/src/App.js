@@ -23,15 +23,33 @@ export default function RAGInterface() {
         }),
       });
 
-      const data = await response.json();
-      console.log('Search Results:', data);  // Logs the response data to the terminal
+      if (!response.ok) {
+        throw new Error(`Request failed with status ${response.status}`);
+      }
+
+      // The answer is streamed as server-sent events, one JSON string per chunk
+      const setResponse = mode === 'rag' ? setRagResponse : setOpenAIResponse;
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let text = '';
+      setLoading(false);
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
 
-      
-      if (mode === 'rag') {
-        setRagResponse(data);
-      } else {
-        setOpenAIResponse(data);
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const event of events) {
+          if (event.startsWith('data: ')) {
+            text += JSON.parse(event.slice(6));
+          }
+        }
+        setResponse({ response: text });
       }
+      console.log('Search Results:', text);  // Logs the response data to the terminal
 
       setHistory(prev => [
         { query, timestamp: new Date().toLocaleString() },